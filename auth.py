@@ -4,6 +4,7 @@ from jose import JWTError, jwt
 from passlib.context import CryptContext
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
+from sqlalchemy import select
 from database import SessionLocal
 from models import User
 
@@ -14,6 +15,8 @@ ACCESS_TOKEN_EXPIRE_MINUTES = 30
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="login")
 
+_DEFAULT_TOKEN_EXPIRES = timedelta(minutes=15)
+
 def get_password_hash(password):
     return pwd_context.hash(password)
 
@@ -25,14 +28,13 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     if expires_delta:
         expire = datetime.now() + expires_delta
     else:
-        expire = datetime.now() + timedelta(minutes=15)
+        expire = datetime.now() + _DEFAULT_TOKEN_EXPIRES
     to_encode.update({"exp": expire})
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
-def get_current_user(token: str = Depends(oauth2_scheme)):
-    db = SessionLocal()
-    try:
+async def get_current_user(token: str = Depends(oauth2_scheme)):
+    async with SessionLocal() as db:
         credentials_exception = HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Token noto‘g‘ri",
@@ -45,9 +47,8 @@ def get_current_user(token: str = Depends(oauth2_scheme)):
                 raise credentials_exception
         except JWTError:
             raise credentials_exception
-        user = db.query(User).filter(User.username == username).first()
+        result = await db.execute(select(User).where(User.username == username))
+        user = result.scalar_one_or_none()
         if user is None:
             raise credentials_exception
-        return user
-    finally:
-        db.close()
\ No newline at end of file
+        return user
\ No newline at end of file
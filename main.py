@@ -1,11 +1,23 @@
+import asyncio
+import hashlib
+import logging
+import os
+from contextlib import asynccontextmanager
+from functools import wraps
 from datetime import timedelta
-from fastapi import FastAPI, Depends, HTTPException, Request, status
+from fastapi import FastAPI, Depends, HTTPException, Query, Request, status
 from fastapi.security import OAuth2PasswordRequestForm
-from fastapi.responses import JSONResponse
+from fastapi.responses import ORJSONResponse
 from fastapi.middleware.cors import CORSMiddleware
-from sqlalchemy.orm import Session
+from fastapi_cache import FastAPICache
+from fastapi_cache.backends.inmemory import InMemoryBackend
+from fastapi_cache.backends.redis import RedisBackend
+from fastapi_cache.decorator import cache
+from redis import asyncio as aioredis
+from sqlalchemy import bindparam, exists, select
+from sqlalchemy.orm import raiseload
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.exc import IntegrityError, SQLAlchemyError
-from typing import List
 
 from database import SessionLocal, engine
 from models import Base, User, Book
@@ -16,10 +28,46 @@ from auth import (
 )
 import uvicorn
 
-# Create database tables
-Base.metadata.create_all(bind=engine)
 
-app = FastAPI()
+logger = logging.getLogger("library")
+
+REDIS_URL = os.environ.get("REDIS_URL", "redis://localhost:6379")
+ACCESS_TOKEN_EXPIRES = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
+
+# Short error codes for the catch-all handler: stringifying exceptions like
+# IntegrityError re-formats the full SQL + params and leaks it to the client
+_ERROR_CODES = {
+    IntegrityError: "DB_CONSTRAINT",
+    SQLAlchemyError: "DB_ERROR",
+}
+
+
+def error_code(exc: Exception) -> str:
+    for exc_type, code in _ERROR_CODES.items():
+        if isinstance(exc, exc_type):
+            return code
+    return "INTERNAL_ERROR"
+
+
+# Create database tables on startup (async engine can't run create_all at import time)
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    try:
+        redis = aioredis.from_url(REDIS_URL, socket_connect_timeout=1)
+        await redis.ping()
+        FastAPICache.init(RedisBackend(redis), prefix="lib")
+    except Exception:
+        # No Redis available (dev/test) - cache in-process instead of failing startup
+        FastAPICache.init(InMemoryBackend(), prefix="lib")
+    # Prebuild the OpenAPI schema (app.openapi caches it) so the first
+    # request to /docs or /openapi.json doesn't pay the introspection cost
+    app.openapi()
+    yield
+
+
+app = FastAPI(lifespan=lifespan, default_response_class=ORJSONResponse)
 
 # Add middleware
 app.add_middleware(
@@ -31,228 +79,321 @@ app.add_middleware(
 )
 
 
-# Global exception handler for unexpected errors
-@app.middleware("http")
-async def catch_exceptions_middleware(request: Request, call_next):
-    try:
-        return await call_next(request)
-    except Exception as e:
-        error_detail = {"detail": str(e), "type": type(e).__name__}
-        return JSONResponse(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            content=error_detail
-        )
+# Global exception handler for unexpected errors; registered at the ASGI
+# level so well-behaved requests don't pay for an extra middleware frame
+@app.exception_handler(Exception)
+async def unhandled_exception_handler(request: Request, exc: Exception):
+    logger.exception("Unhandled error on %s %s", request.method, request.url.path, exc_info=exc)
+    return ORJSONResponse(
+        status_code=status.HTTP_400_BAD_REQUEST,
+        content={"code": error_code(exc)}
+    )
 
 
 # Database session management
-def get_db():
-    db = SessionLocal()
-    try:
+async def get_db():
+    async with SessionLocal() as db:
         yield db
-    finally:
-        db.close()
+
+
+# The write already committed by the time we clear the cache; a cache outage
+# must not turn that success into an error response, so log and move on
+# (stale entries age out at the TTL anyway).
+async def clear_book_cache():
+    try:
+        await FastAPICache.clear()
+    except Exception:
+        logger.exception("Keshni tozalashda xatolik")
+
+
+# fastapi-cache2's default key builder hashes the endpoint kwargs verbatim,
+# and the injected db session reprs its memory address, so every request
+# would get a unique key and never hit. Key on the real arguments only.
+def cache_key_builder(func, namespace="", *, request=None, response=None, args=(), kwargs=None):
+    kwargs = {k: v for k, v in (kwargs or {}).items() if k != "db"}
+    cache_key = hashlib.md5(
+        f"{func.__module__}:{func.__name__}:{args}:{kwargs}".encode()
+    ).hexdigest()
+    return f"{namespace}:{cache_key}"
+
+
+# Stale fallback for the cached reads: remember the last payload each worker
+# produced per argument set and serve it if the database is unreachable. The
+# read handlers only raise 400 from their DB-failure catch-alls (404 means
+# the book genuinely isn't there), so that's the signal to fall back on.
+def stale_fallback(func):
+    stale = {}
+
+    @wraps(func)
+    async def wrapper(*args, **kwargs):
+        key = cache_key_builder(func, "stale", args=args, kwargs=kwargs)
+        try:
+            payload = await func(*args, **kwargs)
+        except HTTPException as exc:
+            if exc.status_code == 400 and key in stale:
+                logger.warning("Baza ishlamayapti, eski javob qaytarilmoqda: %s", key)
+                return stale[key]
+            raise
+        stale[key] = payload
+        return payload
+
+    return wrapper
+
+
+# Base Book query: raiseload makes any future lazy-loaded relationship fail
+# loudly instead of silently issuing per-row SELECTs. Eager-load explicitly
+# (selectinload) if a relationship is ever needed in a response.
+def select_books():
+    return select(Book).options(raiseload('*'))
+
+
+# Hot lookups, built once at import so the Select construction cost isn't
+# paid per request; the engine's query cache keeps the compiled SQL around.
+_GET_BOOK_BY_ID = select_books().where(Book.id == bindparam('id'))
+_GET_BOOK_BY_ISBN = select_books().where(Book.isbn == bindparam('isbn'))
+_GET_BOOKS_BY_TITLE = select_books().where(Book.title == bindparam('title'))
+_GET_BOOKS_BY_AUTHOR = select_books().where(Book.author == bindparam('author'))
+_GET_USER_BY_USERNAME = select(User).where(User.username == bindparam('username'))
+# EXISTS: one boolean back from the DB, no row marshalling or ORM hydration
+_USERNAME_TAKEN = select(exists().where(User.username == bindparam('username')))
+
+
+# Rows coming out of our own tables are already valid, so skip the Pydantic
+# validators (isbn checks etc.) and build the response schema directly.
+def serialize_book(book: Book) -> dict:
+    return BookSchema.model_construct(
+        id=book.id, title=book.title, author=book.author, isbn=book.isbn
+    ).model_dump()
 
 
 # User registration
 @app.post("/register", response_model=Token)
-def register(user: UserCreate, db: Session = Depends(get_db)):
+async def register(user: UserCreate, db: AsyncSession = Depends(get_db)):
     try:
-        db_user = db.query(User).filter(User.username == user.username).first()
-        if db_user:
+        result = await db.execute(_USERNAME_TAKEN, {"username": user.username})
+        if result.scalar():
             raise HTTPException(
                 status_code=400,
                 detail="Bu username allaqachon mavjud"
             )
 
-        hashed_password = get_password_hash(user.password)
+        # bcrypt costs ~100ms of CPU; run it off the event loop
+        hashed_password = await asyncio.to_thread(get_password_hash, user.password)
         new_user = User(username=user.username, hashed_password=hashed_password)
 
         db.add(new_user)
-        db.commit()
-        db.refresh(new_user)
+        await db.commit()
+        await db.refresh(new_user)
 
         access_token = create_access_token(data={"sub": new_user.username})
         return {"access_token": access_token, "token_type": "bearer"}
 
-    except IntegrityError as e:
-        db.rollback()
+    except IntegrityError:
+        logger.exception("Ma'lumot bazasi xatosi yuz berdi")
+        await db.rollback()
         raise HTTPException(
             status_code=400,
-            detail=f"Ma'lumot bazasi xatosi yuz berdi: {str(e)}"
+            detail="Ma'lumot bazasi xatosi yuz berdi"
         )
-    except Exception as e:
-        db.rollback()
+    except HTTPException:
+        raise
+    except Exception:
+        logger.exception("Ro'yxatdan o'tishda xatolik")
+        await db.rollback()
         raise HTTPException(
             status_code=400,
-            detail=f"Ro'yxatdan o'tishda xatolik: {str(e)}"
+            detail="Ro'yxatdan o'tishda xatolik"
         )
 
 
 # User login
 @app.post("/login", response_model=Token)
-def login(form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_db)):
+async def login(form_data: OAuth2PasswordRequestForm = Depends(), db: AsyncSession = Depends(get_db)):
     try:
-        user = db.query(User).filter(User.username == form_data.username).first()
-        if not user or not verify_password(form_data.password, user.hashed_password):
+        result = await db.execute(_GET_USER_BY_USERNAME, {"username": form_data.username})
+        user = result.scalar_one_or_none()
+        if not user or not await asyncio.to_thread(verify_password, form_data.password, user.hashed_password):
             raise HTTPException(
                 status_code=401,
                 detail="Noto'g'ri username yoki parol"
             )
 
-        access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
         access_token = create_access_token(
             data={"sub": user.username},
-            expires_delta=access_token_expires
+            expires_delta=ACCESS_TOKEN_EXPIRES
         )
         return {"access_token": access_token, "token_type": "bearer"}
 
     except HTTPException:
         raise
-    except Exception as e:
+    except Exception:
+        logger.exception("Kirishda xatolik")
         raise HTTPException(
             status_code=400,
-            detail=f"Kirishda xatolik: {str(e)}"
+            detail="Kirishda xatolik"
         )
 
 
 # Create new book
 @app.post("/books", response_model=BookSchema)
-def create_book(book: BookCreate, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
+async def create_book(book: BookCreate, db: AsyncSession = Depends(get_db), current_user: User = Depends(get_current_user)):
     try:
-        # Check if book with same ISBN exists
-        existing_book = db.query(Book).filter(Book.isbn == book.isbn).first()
-        if existing_book:
-            raise HTTPException(
-                status_code=400,
-                detail="Bu ISBN raqamli kitob allaqachon mavjud"
-            )
-
+        # The unique index on isbn signals duplicates; no need for a pre-SELECT
         db_book = Book(**book.model_dump())
         db.add(db_book)
-        db.commit()
-        db.refresh(db_book)
+        await db.commit()
+        await db.refresh(db_book)
+        await clear_book_cache()
         return db_book
 
-    except IntegrityError as e:
-        db.rollback()
+    except IntegrityError:
+        await db.rollback()
         raise HTTPException(
             status_code=400,
-            detail=f"Ma'lumotlar bazasi xatoligi: {str(e)}"
+            detail="Bu ISBN raqamli kitob allaqachon mavjud"
         )
-    except SQLAlchemyError as e:
-        db.rollback()
+    except HTTPException:
+        raise
+    except SQLAlchemyError:
+        logger.exception("Kitob saqlashda xatolik")
+        await db.rollback()
         raise HTTPException(
             status_code=400,
-            detail=f"Kitob saqlashda xatolik: {str(e)}"
+            detail="Kitob saqlashda xatolik"
         )
-    except Exception as e:
-        db.rollback()
+    except Exception:
+        logger.exception("Kitob qo'shishda xatolik")
+        await db.rollback()
         raise HTTPException(
             status_code=400,
-            detail=f"Kitob qo'shishda xatolik: {str(e)}"
+            detail="Kitob qo'shishda xatolik"
         )
 
 
-# Get all books
-@app.get("/books", response_model=List[BookSchema])
-def read_books(db: Session = Depends(get_db)):
+# Get all books (paginated so large tables aren't materialized wholesale)
+@app.get("/books")
+@cache(expire=20, key_builder=cache_key_builder)
+@stale_fallback
+async def read_books(
+        limit: int = Query(100, ge=1, le=1000),
+        offset: int = Query(0, ge=0),
+        db: AsyncSession = Depends(get_db)
+):
     try:
-        return db.query(Book).all()
-    except Exception as e:
+        stmt = select_books().order_by(Book.id).limit(limit).offset(offset)
+        result = await db.execute(stmt)
+        return [serialize_book(b) for b in result.scalars()]
+    except Exception:
+        logger.exception("Kitoblarni olishda xatolik")
         raise HTTPException(
             status_code=400,
-            detail=f"Kitoblarni olishda xatolik: {str(e)}"
+            detail="Kitoblarni olishda xatolik"
         )
 
 
 # Delete book
 @app.delete("/books/{book_id}", response_model=BookSchema)
-def delete_book(book_id: int, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
+async def delete_book(book_id: int, db: AsyncSession = Depends(get_db), current_user: User = Depends(get_current_user)):
     try:
-        book = db.query(Book).filter(Book.id == book_id).first()
+        result = await db.execute(_GET_BOOK_BY_ID, {"id": book_id})
+        book = result.scalar_one_or_none()
         if not book:
             raise HTTPException(
                 status_code=404,
                 detail="Kitob topilmadi"
             )
 
-        db.delete(book)
-        db.commit()
+        await db.delete(book)
+        await db.commit()
+        await clear_book_cache()
         return book
 
     except HTTPException:
         raise
-    except SQLAlchemyError as e:
-        db.rollback()
+    except SQLAlchemyError:
+        logger.exception("Kitobni o'chirishda xatolik")
+        await db.rollback()
         raise HTTPException(
             status_code=400,
-            detail=f"Kitobni o'chirishda xatolik: {str(e)}"
+            detail="Kitobni o'chirishda xatolik"
         )
-    except Exception as e:
-        db.rollback()
+    except Exception:
+        logger.exception("Kitobni o'chirishda xatolik")
+        await db.rollback()
         raise HTTPException(
             status_code=400,
-            detail=f"Kitobni o'chirishda xatolik: {str(e)}"
+            detail="Kitobni o'chirishda xatolik"
         )
 
 
 # Get books by name
-@app.get("/books/name/{name}", response_model=List[BookSchema])
-def get_books_by_name(name: str, db: Session = Depends(get_db)):
+@app.get("/books/name/{name}")
+@cache(expire=20, key_builder=cache_key_builder)
+@stale_fallback
+async def get_books_by_name(name: str, db: AsyncSession = Depends(get_db)):
     try:
-        books = db.query(Book).filter(Book.title == name).all()
-        return books
-    except Exception as e:
+        result = await db.execute(_GET_BOOKS_BY_TITLE, {"title": name})
+        return [serialize_book(b) for b in result.scalars()]
+    except Exception:
+        logger.exception("Kitoblarni nom bo'yicha olishda xatolik")
         raise HTTPException(
             status_code=400,
-            detail=f"Kitoblarni nom bo'yicha olishda xatolik: {str(e)}"
+            detail="Kitoblarni nom bo'yicha olishda xatolik"
         )
 
 
 # Get book by ISBN
-@app.get("/books/isbn/{isbn}", response_model=BookSchema)
-def get_book_by_isbn(isbn: str, db: Session = Depends(get_db)):
+@app.get("/books/isbn/{isbn}")
+@cache(expire=20, key_builder=cache_key_builder)
+@stale_fallback
+async def get_book_by_isbn(isbn: str, db: AsyncSession = Depends(get_db)):
     try:
-        book = db.query(Book).filter(Book.isbn == isbn).first()
+        result = await db.execute(_GET_BOOK_BY_ISBN, {"isbn": isbn})
+        book = result.scalar_one_or_none()
         if not book:
             raise HTTPException(
                 status_code=404,
                 detail="Kitob topilmadi"
             )
-        return book
+        return serialize_book(book)
 
     except HTTPException:
         raise
-    except Exception as e:
+    except Exception:
+        logger.exception("ISBN bo'yicha kitobni olishda xatolik")
         raise HTTPException(
             status_code=400,
-            detail=f"ISBN bo'yicha kitobni olishda xatolik: {str(e)}"
+            detail="ISBN bo'yicha kitobni olishda xatolik"
         )
 
 
 # Get books by author
-@app.get("/books/author/{author}", response_model=List[BookSchema])
-def get_books_by_author(author: str, db: Session = Depends(get_db)):
+@app.get("/books/author/{author}")
+@cache(expire=20, key_builder=cache_key_builder)
+@stale_fallback
+async def get_books_by_author(author: str, db: AsyncSession = Depends(get_db)):
     try:
-        books = db.query(Book).filter(Book.author == author).all()
-        return books
-    except Exception as e:
+        result = await db.execute(_GET_BOOKS_BY_AUTHOR, {"author": author})
+        return [serialize_book(b) for b in result.scalars()]
+    except Exception:
+        logger.exception("Muallif bo'yicha kitoblarni olishda xatolik")
         raise HTTPException(
             status_code=400,
-            detail=f"Muallif bo'yicha kitoblarni olishda xatolik: {str(e)}"
+            detail="Muallif bo'yicha kitoblarni olishda xatolik"
         )
 
 
 # Update book
 @app.put("/books/{book_id}", response_model=BookSchema)
-def update_book(
+async def update_book(
         book_id: int,
         book_update: BookUpdate,
-        db: Session = Depends(get_db),
+        db: AsyncSession = Depends(get_db),
         current_user: User = Depends(get_current_user)
 ):
     try:
-        db_book = db.query(Book).filter(Book.id == book_id).first()
+        result = await db.execute(_GET_BOOK_BY_ID, {"id": book_id})
+        db_book = result.scalar_one_or_none()
         if not db_book:
             raise HTTPException(
                 status_code=404,
@@ -261,34 +402,30 @@ def update_book(
 
         update_data = book_update.model_dump(exclude_unset=True)
         for key, value in update_data.items():
-            if key == "isbn" and value != db_book.isbn:
-                existing_book = db.query(Book).filter(Book.isbn == value).first()
-                if existing_book and existing_book.id != book_id:
-                    raise HTTPException(
-                        status_code=400,
-                        detail="Bu ISBN allaqachon mavjud"
-                    )
             setattr(db_book, key, value)
 
-        db.commit()
-        db.refresh(db_book)
+        # A conflicting isbn trips the unique index on commit; no pre-SELECT needed
+        await db.commit()
+        await db.refresh(db_book)
+        await clear_book_cache()
         return db_book
 
-    except IntegrityError as e:
-        db.rollback()
+    except IntegrityError:
+        await db.rollback()
         raise HTTPException(
             status_code=400,
-            detail=f"Ma'lumotlar bazasi xatoligi: {str(e)}"
+            detail="Bu ISBN allaqachon mavjud"
         )
     except HTTPException:
         raise
-    except Exception as e:
-        db.rollback()
+    except Exception:
+        logger.exception("Kitobni yangilashda xatolik")
+        await db.rollback()
         raise HTTPException(
             status_code=400,
-            detail=f"Kitobni yangilashda xatolik: {str(e)}"
+            detail="Kitobni yangilashda xatolik"
         )
 
 
 if __name__ == "__main__":
-    uvicorn.run(app, host="0.0.0.0", port=8000)
\ No newline at end of file
+    uvicorn.run(app, host="0.0.0.0", port=8000)
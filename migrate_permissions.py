@@ -0,0 +1,22 @@
+"""One-off migration: convert legacy CSV permissions values to Perm bitmasks."""
+import asyncio
+from sqlalchemy import select, update
+
+from database import SessionLocal
+from models import Perm, User
+
+
+async def migrate():
+    async with SessionLocal() as db:
+        result = await db.execute(select(User.id, User.permissions))
+        for user_id, permissions in result:
+            if isinstance(permissions, str):
+                mask = int(Perm.from_csv(permissions))
+                await db.execute(
+                    update(User).where(User.id == user_id).values(permissions=mask)
+                )
+        await db.commit()
+
+
+if __name__ == "__main__":
+    asyncio.run(migrate())
@@ -1,12 +1,33 @@
+from enum import IntFlag
 from sqlalchemy import Column, Integer, String
 from database import Base
 
+
+class Perm(IntFlag):
+    READ_BOOK = 1
+    CREATE_BOOK = 2
+    DELETE_BOOK = 4
+
+    @classmethod
+    def from_csv(cls, value: str) -> "Perm":
+        # Maps legacy "create_book,delete_book" strings onto the bitmask
+        perms = cls(0)
+        for name in value.split(","):
+            name = name.strip()
+            if name:
+                perms |= cls[name.upper()]
+        return perms
+
+
 class User(Base):
     __tablename__ = "users"
     id = Column(Integer, primary_key=True, index=True)
     username = Column(String, unique=True, index=True)
     hashed_password = Column(String)
-    permissions = Column(String)  # Masalan: "create_book,delete_book"
+    permissions = Column(Integer, default=int(Perm.READ_BOOK))  # Perm bitmask
+
+    def has_perm(self, perm: Perm) -> bool:
+        return bool(self.permissions & perm)
 
 class Book(Base):
     __tablename__ = "books"
@@ -1,35 +1,37 @@
+import asyncio
+import os
+
 import pytest
 from fastapi.testclient import TestClient
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker
-from sqlalchemy.pool import StaticPool
+from fastapi_cache import FastAPICache
+from fastapi_cache.backends.inmemory import InMemoryBackend
+from sqlalchemy import delete
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+from sqlalchemy.pool import NullPool
 from main import app, get_db
-from database import Base
-from models import User, Book
+from database import Base, configure_sqlite_pragmas
+from models import User, Book, Perm
 from auth import get_password_hash, get_current_user, oauth2_scheme
 
-# Test database setup
-TEST_SQLALCHEMY_DATABASE_URL = "sqlite:///:memory:"
-engine = create_engine(
+# Test database setup (NullPool: connections must not outlive the event loop they were created on)
+TEST_SQLALCHEMY_DATABASE_URL = "sqlite+aiosqlite:///./test.db"
+engine = create_async_engine(
     TEST_SQLALCHEMY_DATABASE_URL,
     connect_args={"check_same_thread": False},
-    poolclass=StaticPool,
+    poolclass=NullPool,
 )
-TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+configure_sqlite_pragmas(engine)
+TestingSessionLocal = async_sessionmaker(autoflush=False, expire_on_commit=False, bind=engine)
 
 # Override get_db dependency
-def override_get_db():
-    db = None
-    try:
-        db = TestingSessionLocal()
+async def override_get_db():
+    async with TestingSessionLocal() as db:
         yield db
-    finally:
-        if db is not None:
-            db.close()
 
 # Override authentication for tests
 async def override_get_current_user():
-    return {"username": "testuser", "permissions": "read_book,create_book"}
+    return {"username": "testuser", "permissions": int(Perm.READ_BOOK | Perm.CREATE_BOOK)}
 
 # Apply dependency overrides
 app.dependency_overrides = {
@@ -38,27 +40,53 @@ app.dependency_overrides = {
     get_current_user: override_get_current_user
 }
 
-# Setup test client
+# Setup test client (lifespan doesn't run here, so init the cache by hand)
+FastAPICache.init(InMemoryBackend(), prefix="lib")
 client = TestClient(app)
 
+# Hash once for the whole suite; bcrypt is by far the slowest part of setup
+TEST_PASSWORD_HASH = get_password_hash("password123")
+
+async def _create_schema():
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+
+async def _drop_schema():
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.drop_all)
+
+async def _reset_test_data():
+    async with TestingSessionLocal() as db:
+        await db.execute(delete(Book))
+        await db.execute(delete(User))
+        test_user = User(
+            username="testuser",
+            hashed_password=TEST_PASSWORD_HASH,
+            permissions=int(Perm.READ_BOOK | Perm.CREATE_BOOK)
+        )
+        db.add(test_user)
+        test_book1 = Book(title="Test Book 1", author="Test Author 1", isbn="9781234567890")
+        test_book2 = Book(title="Test Book 2", author="Test Author 2", isbn="9789876543210")
+        db.add(test_book1)
+        db.add(test_book2)
+        await db.commit()
+
+@pytest.fixture(scope="session", autouse=True)
+def database_schema():
+    asyncio.run(_create_schema())
+    yield
+    asyncio.run(_drop_schema())
+    for suffix in ("", "-wal", "-shm"):
+        try:
+            os.unlink(f"./test.db{suffix}")
+        except FileNotFoundError:
+            pass
+
 @pytest.fixture(scope="function")
 def setup_database():
-    Base.metadata.create_all(bind=engine)
-    db = TestingSessionLocal()
-    test_user = User(
-        username="testuser",
-        hashed_password=get_password_hash("password123"),
-        permissions="read_book,create_book"
-    )
-    db.add(test_user)
-    test_book1 = Book(title="Test Book 1", author="Test Author 1", isbn="9781234567890")
-    test_book2 = Book(title="Test Book 2", author="Test Author 2", isbn="9789876543210")
-    db.add(test_book1)
-    db.add(test_book2)
-    db.commit()
-    db.close()
+    asyncio.run(_reset_test_data())
+    asyncio.run(FastAPICache.clear())
     yield
-    Base.metadata.drop_all(bind=engine)
 
 @pytest.fixture
 def auth_token():
@@ -109,6 +137,37 @@ def test_get_all_books(setup_database):
     assert len(response.json()) == 2
 
 
+def test_read_books_serves_stale_on_db_failure(setup_database):
+    client.get("/books")  # prime the stale copy
+
+    class BrokenSession:
+        async def execute(self, *args, **kwargs):
+            raise SQLAlchemyError("db down")
+
+    async def broken_get_db():
+        yield BrokenSession()
+
+    app.dependency_overrides[get_db] = broken_get_db
+    try:
+        # no-store skips the response cache so the handler really hits the DB
+        response = client.get("/books", headers={"Cache-Control": "no-store"})
+        assert response.status_code == 200
+        assert len(response.json()) == 2
+    finally:
+        app.dependency_overrides[get_db] = override_get_db
+
+
+def test_get_all_books_served_from_cache(setup_database):
+    store = FastAPICache.get_backend()._store
+    assert len(store) == 0
+    first = client.get("/books").json()
+    assert len(store) == 1
+    # A second identical GET must reuse the same key, not mint a new one
+    second = client.get("/books").json()
+    assert len(store) == 1
+    assert second == first
+
+
 def test_create_book_success(setup_database, auth_token):
     response = client.post(
         "/books",
@@ -131,6 +190,15 @@ def test_create_book_duplicate_isbn(setup_database, auth_token):
     assert "Bu ISBN raqamli kitob allaqachon mavjud" in response.json()["detail"]
 
 
+def test_create_book_invalid_isbn(setup_database, auth_token):
+    response = client.post(
+        "/books",
+        headers=auth_token,
+        json={"title": "Bad ISBN", "author": "Some Author", "isbn": "!!!!!!!!!!"}
+    )
+    assert response.status_code == 422
+
+
 def test_delete_book_success(setup_database, auth_token):
     # First get all books to find an id
     books = client.get("/books").json()